@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 
-import argparse
+import collections
+import concurrent.futures
+import mmap
 import os
+import selectors
 import socket
 import sys
 import time
-import datetime
 import signal
+import stat
+import threading
 import zipfile
-from pathlib import Path
 
 # Add signal handler for clean exit on Ctrl+C
 def signal_handler(sig, frame):
@@ -17,29 +20,169 @@ def signal_handler(sig, frame):
 
 signal.signal(signal.SIGINT, signal_handler)
 
+# TCP_CORK (Linux) / TCP_NOPUSH (BSD, macOS) hold back partial segments
+# until the socket is uncorked or closed, so a reply leaves in full-sized
+# packets with the FIN piggybacked on the last one
+TCP_CORK = getattr(socket, 'TCP_CORK', getattr(socket, 'TCP_NOPUSH', None))
+
+def set_cork(sock, enabled):
+    """Cork or uncork a TCP socket, where the platform supports it"""
+    if TCP_CORK is None:
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, TCP_CORK, 1 if enabled else 0)
+    except OSError:
+        pass
+
+# Read size used when streaming test cases that have no file descriptor
+STREAM_CHUNK_SIZE = 1 << 16
+
+# Number of zip entries decompressed ahead of the one being injected, and
+# the largest entry worth holding in memory for that; bigger ones are streamed
+PREFETCH_DEPTH = 2
+PREFETCH_MAX_SIZE = 1 << 20
+
+def regular_file_size(stream):
+    """Return the size of stream if it is a regular file, else None
+
+    Pipes, FIFOs, /dev/stdin and streams without a file descriptor report
+    no usable size and cannot be sent with sendfile(2).
+    """
+    try:
+        st = os.fstat(stream.fileno())
+    except (AttributeError, OSError, ValueError):
+        return None
+    return st.st_size if stat.S_ISREG(st.st_mode) else None
+
+# Reply sent once all test cases have been injected
+DEFAULT_RESPONSE = (b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: text/plain\r\n"
+                    b"Content-Length: 13\r\n"
+                    b"Connection: close\r\n"
+                    b"\r\n"
+                    b"Hello, World!")
+
+def send_file(sock, file):
+    """Send the rest of a regular file without copying it through Python
+
+    Uses sendfile(2) where the OS has it. Elsewhere socket.sendfile() would
+    fall back to reading the file in small chunks, so the file is memory
+    mapped and sent straight from the mapping instead. Only regular files
+    may be passed: sendfile(2) sends nothing for a pipe, so inject() sends
+    those through its chunked read loop on every platform.
+    """
+    if hasattr(os, 'sendfile'):
+        sock.sendfile(file)
+        return
+    try:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Empty files cannot be mapped; socket.sendfile() copes with them
+        sock.sendfile(file)
+        return
+    with mapping:
+        sock.sendall(memoryview(mapping)[file.tell():])
+
+# Send buffer for client sockets. A bigger buffer lets more of a large test
+# case sit in the kernel, so throughput to a client on a long, fast path is
+# not capped by the buffer. A fixed SO_SNDBUF turns off Linux autotuning,
+# so it is only set where it raises the limit (see wants_send_buffer()).
+SEND_BUFFER_SIZE = 1 << 20
+
+def wants_send_buffer(sock):
+    """Return True if SEND_BUFFER_SIZE is above what sock would get anyway
+
+    On Linux the autotuned maximum from tcp_wmem is the limit; elsewhere it
+    is the socket's default send buffer.
+    """
+    try:
+        with open('/proc/sys/net/ipv4/tcp_wmem') as f:
+            limit = int(f.read().split()[2])
+    except (OSError, ValueError, IndexError):
+        limit = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+    return SEND_BUFFER_SIZE > limit
+
+# Seconds the kernel holds a new connection back from accept() while waiting
+# for its request (TCP_DEFER_ACCEPT); after that it is handed over anyway
+DEFER_ACCEPT_SECONDS = 5
+
+# Seconds to wait for the request once a connection has been accepted, so a
+# client that never sends one cannot stall the server
+REQUEST_TIMEOUT_SECONDS = 10
+
+def accept_client(server_socket):
+    """Accept a connection and tune the client socket for replying"""
+    client_socket, addr = server_socket.accept()
+    # Replies are small and written in one go; don't let Nagle hold them
+    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return client_socket, addr
+
+def set_quickack(sock):
+    """Acknowledge the request immediately instead of delaying the ACK (Linux)"""
+    if hasattr(socket, 'TCP_QUICKACK'):
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        except OSError:
+            pass
+
+def receive_request(sock, buf):
+    """Read the client's request into buf and return its length
+
+    Raises socket.timeout if nothing arrives within REQUEST_TIMEOUT_SECONDS;
+    the socket is back in blocking mode for sending the reply.
+    """
+    sock.settimeout(REQUEST_TIMEOUT_SECONDS)
+    try:
+        size = sock.recv_into(buf)
+    finally:
+        sock.settimeout(None)
+    set_quickack(sock)
+    return size
+
+# Longest request line echoed to the log
+MAX_LOGGED_REQUEST_LINE = 80
+
+def request_line(buf, size):
+    """Return the first line of a raw HTTP request, for logging
+
+    buf holds the request in its first size bytes. Only that line is
+    decoded, and at most MAX_LOGGED_REQUEST_LINE bytes of it, instead of
+    decoding and splitting the whole request.
+    """
+    limit = min(size, MAX_LOGGED_REQUEST_LINE)
+    end = buf.find(b'\n', 0, limit)
+    if end < 0:
+        end = limit
+    return str(memoryview(buf)[:end], 'ascii', 'replace').rstrip('\r')
+
+USAGE = """\
+================================================================================
+HTTP Reply Test Server - Available Options:
+================================================================================
+-port       : Port number to listen on (default: 8000)
+-closedelay : Delay in milliseconds before closing socket (default: 0)
+-single     : Inject single test case with specified index
+-start      : Start test case index (default: 0)
+-stop       : Stop test case index (default: max int)
+-file       : Send single file instead of test cases
+-testdir    : Directory containing test cases (default: testcases)
+-zip        : Path to zip file containing test cases
+-reuseport  : Let several server processes share the port (SO_REUSEPORT)
+-h, --help  : Show this help message and exit
+================================================================================
+Test Case Lookup Order:
+1. If -file is specified, that single file will be used
+2. If -zip is specified, test cases will be loaded from that zip file
+3. Otherwise, the server will look for a file named '<testdir>.zip' (default: testcases.zip)
+4. If zip file is not found, the server will look in the directory specified by -testdir
+5. Test case files must have numeric filenames matching the -start and -stop range
+================================================================================
+
+"""
+
 def print_usage():
     """Print information about all available command-line options"""
-    print("=" * 80)
-    print("HTTP Reply Test Server - Available Options:")
-    print("=" * 80)
-    print("-port       : Port number to listen on (default: 8000)")
-    print("-closedelay : Delay in milliseconds before closing socket (default: 0)")
-    print("-single     : Inject single test case with specified index")
-    print("-start      : Start test case index (default: 0)")
-    print("-stop       : Stop test case index (default: max int)")
-    print("-file       : Send single file instead of test cases")
-    print("-testdir    : Directory containing test cases (default: testcases)")
-    print("-zip        : Path to zip file containing test cases")
-    print("-h, --help  : Show this help message and exit")
-    print("=" * 80)
-    print("Test Case Lookup Order:")
-    print("1. If -file is specified, that single file will be used")
-    print("2. If -zip is specified, test cases will be loaded from that zip file")
-    print("3. Otherwise, the server will look for a file named '<testdir>.zip' (default: testcases.zip)")
-    print("4. If zip file is not found, the server will look in the directory specified by -testdir")
-    print("5. Test case files must have numeric filenames matching the -start and -stop range")
-    print("=" * 80)
-    print("")
+    sys.stdout.write(USAGE)
 
 class HTTPReplyTestServer:
     def __init__(self):
@@ -51,82 +194,167 @@ class HTTPReplyTestServer:
         self.single_file = None
         self.server_socket = None
         self.zip_file = None
+        self.reuse_port = False
+        # Sorted (index, path) tuples from the test case directory, filled
+        # in by _discover_cases(); _enumerate_cases() is its only caller and
+        # runs once per process, so the directory is listed at most once
+        self._cached_cases = None
+        # Zip file the test cases are served from, see _enumerate_cases()
+        self._zip_ref = None
+        # Per-connection log lines go straight to the binary stderr buffer
+        self._log_buf = sys.stderr.buffer
+        # Receive buffer reused for every request. Connections are handled
+        # one at a time on the main thread, so a single buffer is safe; it
+        # must not be shared if requests are ever read concurrently.
+        self._req_buf = bytearray(4096)
+        # Selector watching the server socket and the signal wakeup socket,
+        # set up in prepare() and used by _wait_for_client()
+        self._selector = None
+        self._wakeup_r = None
+        self._wakeup_w = None
+
+    def _log(self, msg):
+        """Write a log line to stderr as a single write"""
+        self._log_buf.write(msg.encode() + b'\n')
+        self._log_buf.flush()
+
+    def _close_client(self, sock):
+        """Close a client socket, reporting rather than raising errors"""
+        try:
+            sock.close()
+        except Exception as s:
+            self._log(f"Error: {str(s)}")
 
     def prepare(self):
         """Open server socket to accept connections"""
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            # Set a timeout so we can handle keyboard interrupts
-            self.server_socket.settimeout(1.0)
+            # With -reuseport several server processes can share the port and
+            # the kernel spreads connections between them. Off by default: each
+            # process then sees only part of the test case sequence, and a
+            # second server on a busy port would start without any error.
+            if self.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            # Set before listen() so accepted sockets inherit it
+            if wants_send_buffer(self.server_socket):
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+            # Linux: only wake accept() once the request has arrived, so the
+            # recv() that follows usually returns at once. A silent client is
+            # still handed over after DEFER_ACCEPT_SECONDS and is then bounded
+            # by the request timeout in receive_request().
+            if hasattr(socket, 'TCP_DEFER_ACCEPT'):
+                self.server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_DEFER_ACCEPT, DEFER_ACCEPT_SECONDS)
             self.server_socket.bind(('0.0.0.0', self.port))
-            self.server_socket.listen(1)
+            # A backlog of 1 makes the kernel drop concurrent connection attempts
+            self.server_socket.listen(socket.SOMAXCONN)
+            
+            # Signals write a byte to the wakeup socket, so a Ctrl+C wakes the
+            # selector even if it arrives just before select() is entered
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
+            self._wakeup_r.setblocking(False)
+            self._wakeup_w.setblocking(False)
+            signal.set_wakeup_fd(self._wakeup_w.fileno())
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.server_socket, selectors.EVENT_READ)
+            self._selector.register(self._wakeup_r, selectors.EVENT_READ)
             print(f"Server started on port {self.port}")
         except Exception as e:
             print(f"Error: {str(e)}")
             sys.exit(-1)
 
-    def inject(self, index, data):
-        """Inject a test case as HTTP response"""
-        print("Waiting for connect...", end='', flush=True)
+    def _wait_for_client(self):
+        """Block until a client connects and return the accepted connection
+
+        The selector sleeps until the server socket is readable, so the idle
+        server does no work. A signal makes it return through the wakeup
+        socket; the SIGINT handler then exits the server.
+        """
+        while True:
+            for key, _ in self._selector.select():
+                if key.fileobj is self._wakeup_r:
+                    try:
+                        self._wakeup_r.recv(64)
+                    except OSError:
+                        pass
+                else:
+                    return accept_client(self.server_socket)
+
+    def inject(self, index, data, length=None):
+        """Inject a test case as HTTP response
+
+        data is either a bytes-like object, a file opened in binary mode or
+        any other readable binary stream, such as a zip entry. Regular files
+        are sent with send_file() so the payload goes straight from the page
+        cache to the socket; anything else, including pipes, is copied in
+        64 KiB chunks so memory use does not grow with the size of the test
+        case. For streams without a file descriptor the caller may pass the
+        payload length; otherwise it is logged as unknown.
+        """
+        file_size = None
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            length = len(data)
+        else:
+            file_size = regular_file_size(data)
+            if file_size is not None:
+                length = file_size
+        size_text = f"{length} bytes" if length is not None else "unknown length"
         
-        # Set a short timeout to make Ctrl+C more responsive
-        self.server_socket.settimeout(0.5)
+        self._log("Waiting for connect...")
         
-        try:
-            dot_counter = 0
-            while True:
+        while True:
+            try:
+                client_socket, addr = self._wait_for_client()
+                
+                # Read and log the request
                 try:
-                    client_socket, addr = self.server_socket.accept()
-                    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    print(f"\n[{now}] Connection from [{addr[0]}:{addr[1]}]")
-                    
-                    # Read and log the request
-                    try:
-                        request = client_socket.recv(1024)
-                        if request:
-                            request_text = request.decode('utf-8', errors='replace').strip()
-                            first_line = request_text.split('\n')[0] if '\n' in request_text else request_text
-                            print(f"Received request: {first_line}")
-                    except Exception as io:
-                        print(f"Error reading request: {str(io)}")
-                        client_socket.close()
-                        continue
-                        
-                    print(f"Injecting testcase #{index}, data {len(data)} bytes")
-                    
-                    try:
+                    size = receive_request(client_socket, self._req_buf)
+                except Exception as io:
+                    self._log(f"Error reading request: {str(io)}")
+                    self._close_client(client_socket)
+                    continue
+                
+                # Which test case was sent is always recorded; the peer and
+                # request line are dropped under python -O
+                now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+                record = f"[{now}] Injecting testcase #{index}, data {size_text}"
+                if __debug__:
+                    first_line = request_line(self._req_buf, size)
+                    record += f" to [{addr[0]}:{addr[1]}] \"{first_line}\""
+                self._log(record)
+                
+                set_cork(client_socket, True)
+                try:
+                    if isinstance(data, (bytes, bytearray, memoryview)):
                         client_socket.sendall(data)
-                    except Exception as io:
-                        print(f"Error: {str(io)}")
-                    
-                    # Delay before closing if specified
-                    if self.close_delay > 0:
-                        time.sleep(self.close_delay / 1000)  # Convert ms to seconds
-                        
-                    try:
-                        client_socket.close()
-                    except Exception as s:
-                        print(f"Error: {str(s)}")
-                        
-                    # Return after successful injection
-                    return
+                    elif file_size is not None:
+                        send_file(client_socket, data)
+                    else:
+                        while True:
+                            chunk = data.read(STREAM_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            client_socket.sendall(chunk)
+                except Exception as io:
+                    self._log(f"Error: {str(io)}")
+                
+                # Delay before closing if specified
+                if self.close_delay > 0:
+                    # Flush the payload now, the FIN follows after the delay.
+                    # The close runs on a timer thread so the next client can
+                    # be accepted meanwhile; the timer is not a daemon, so the
+                    # server does not exit before the delayed close happens.
+                    set_cork(client_socket, False)
+                    threading.Timer(self.close_delay / 1000, self._close_client, (client_socket,)).start()
+                else:
+                    self._close_client(client_socket)
                     
-                except socket.timeout:
-                    # Print a dot every second to show we're alive
-                    dot_counter += 1
-                    if dot_counter % 2 == 0:  # With 0.5s timeout, this is ~1 second
-                        print(".", end="", flush=True)
-                    continue
-                except KeyboardInterrupt:
-                    print("\nOperation canceled by user.")
-                    sys.exit(0)  # Exit immediately on Ctrl+C
-                except Exception as se:
-                    print(f"\nError: {str(se)}")
-                    return
-        except KeyboardInterrupt:
-            print("\nOperation canceled by user.")
-            sys.exit(0)  # Exit immediately on Ctrl+C
+                # Return after successful injection
+                return
+                
+            except Exception as se:
+                self._log(f"Error: {str(se)}")
+                return
 
     def parse_single_file(self):
         """Parse test case from a single file"""
@@ -134,327 +362,318 @@ class HTTPReplyTestServer:
         
         try:
             with open(self.single_file, 'rb') as file:
-                data = file.read()
-                self.inject(0, data)
+                self.inject(0, file)
         except Exception as e:
             print(f"Error: {str(e)}")
 
-    def parse_zip_test_cases(self):
-        """Parse test cases from a zip file"""
-        print(f"Reading test cases from zip file: {self.zip_file}")
-        
-        try:
-            with zipfile.ZipFile(self.zip_file, 'r') as zip_ref:
-                file_list = zip_ref.namelist()
-                
-                # Filter and sort test cases
-                test_cases = []
-                for file_name in file_list:
-                    # Extract just the filename without directories
-                    base_name = os.path.basename(file_name)
-                    if base_name:  # Skip directories
-                        try:
-                            index = int(base_name)
-                            if self.start_index <= index <= self.stop_index:
-                                test_cases.append((index, file_name))
-                        except ValueError:
-                            # Skip files that don't have numeric names
-                            pass
-                
-                test_cases.sort()  # Sort by index
-                
-                if not test_cases:
-                    print(f"No valid test cases found in zip file in range {self.start_index}-{self.stop_index}")
-                    return
-                
-                print(f"Found {len(test_cases)} test cases in zip file")
-                
-                # Process each test case
+    def _prefetch_zip_entries(self, zip_ref, test_cases):
+        """Yield (index, file_path, future) for zip test cases, reading ahead
+
+        Small entries are decompressed on worker threads while inject() waits
+        for the next client; zlib releases the GIL, so the two overlap. The
+        future holds the entry data, or is None for entries larger than
+        PREFETCH_MAX_SIZE, which the caller streams instead. Entries are
+        opened and closed on the calling thread because ZipFile's open file
+        bookkeeping is not thread-safe; only the reads run on the workers.
+        """
+        def start_read(index, file_path):
+            file = future = None
+            if zip_ref.getinfo(file_path).file_size <= PREFETCH_MAX_SIZE:
+                try:
+                    file = zip_ref.open(file_path)
+                    future = executor.submit(file.read)
+                except Exception as e:
+                    future = concurrent.futures.Future()
+                    future.set_exception(e)
+            return index, file_path, file, future
+
+        def finish_read(index, file_path, file, future):
+            if file is not None:
+                concurrent.futures.wait([future])
+                file.close()
+            return index, file_path, future
+
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=PREFETCH_DEPTH) as executor:
+            try:
                 for index, file_path in test_cases:
-                    try:
-                        with zip_ref.open(file_path) as file:
-                            data = file.read()
-                            self.inject(index, data)
-                    except KeyboardInterrupt:
-                        print("\nTest case injection aborted by user.")
-                        return
-                    except Exception as e:
-                        print(f"Error processing {file_path}: {str(e)}")
-                        
-        except zipfile.BadZipFile:
-            print(f"Error: {self.zip_file} is not a valid zip file")
-        except Exception as e:
-            print(f"Error reading zip file: {str(e)}")
+                    pending.append(start_read(index, file_path))
+                    if len(pending) > PREFETCH_DEPTH:
+                        yield finish_read(*pending.popleft())
+                while pending:
+                    yield finish_read(*pending.popleft())
+            finally:
+                while pending:
+                    finish_read(*pending.popleft())
 
-    def parse_test_cases(self):
-        """Parse test cases from directory or zip file"""
-        if self.single_file:
-            self.parse_single_file()
-            return
-            
-        # First check for explicitly set zip file
-        zip_path = None
-        if self.zip_file:
-            zip_path = self.zip_file
-        else:
-            # Check if a zip file with the same base name as test_case_dir exists
-            auto_zip_path = f"{self.test_case_dir}.zip"
-            if Path(auto_zip_path).exists():
-                print(f"Found zip file {auto_zip_path}, using it instead of directory")
-                zip_path = auto_zip_path
-        
-        # If we have a zip path, use it
-        if zip_path:
+    def _discover_cases(self):
+        """Scan the test case directory once and cache the matching cases"""
+        if self._cached_cases is None:
+            test_cases = []
+            with os.scandir(self.test_case_dir) as entries:
+                for entry in entries:
+                    # isdecimal() skips non-numeric names without the cost of
+                    # raising and catching ValueError from int()
+                    if entry.name.isdecimal():
+                        index = int(entry.name)
+                        if self.start_index <= index <= self.stop_index:
+                            test_cases.append((index, entry.path))
+            test_cases.sort()  # Sort by index
+            self._cached_cases = test_cases
+        return self._cached_cases
+
+    def _discover_zip_cases(self, zip_ref):
+        """Collect the test cases in range from an open zip file"""
+        test_cases = []
+        for file_name in zip_ref.namelist():
+            # Extract just the filename without directories
+            base_name = os.path.basename(file_name)
+            # Directories have an empty base name; like non-numeric names
+            # they fail isdecimal(), which is cheaper than catching ValueError
+            if base_name.isdecimal():
+                index = int(base_name)
+                if self.start_index <= index <= self.stop_index:
+                    test_cases.append((index, file_name))
+        test_cases.sort()  # Sort by index
+        return test_cases
+
+    def _enumerate_cases(self):
+        """Locate the test cases to inject, preferring a zip file
+
+        Returns a (source, test_cases) tuple where source is 'zip' or 'dir'
+        and test_cases is a list of (index, path) tuples sorted by index, or
+        (None, []) if no test cases were found, in which case the reason is
+        reported here. An explicit -zip that is readable but has no test
+        cases in range does not fall back to the directory. A zip file that
+        is used stays open on self._zip_ref until finish().
+        """
+        zip_path = self.zip_file or f"{self.test_case_dir}.zip"
+        zip_exists = os.path.isfile(zip_path)
+        if zip_exists:
+            if not self.zip_file:
+                print(f"Found zip file {zip_path}, using it instead of directory")
             try:
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    file_list = zip_ref.namelist()
-                    
-                    # Filter and sort test cases
-                    test_cases = []
-                    for file_name in file_list:
-                        # Extract just the filename without directories
-                        base_name = os.path.basename(file_name)
-                        if base_name:  # Skip directories
-                            try:
-                                index = int(base_name)
-                                if self.start_index <= index <= self.stop_index:
-                                    test_cases.append((index, file_name))
-                            except ValueError:
-                                # Skip files that don't have numeric names
-                                pass
-                    
-                    test_cases.sort()  # Sort by index
-                    
-                    if not test_cases:
-                        print(f"No valid test cases found in zip file in range {self.start_index}-{self.stop_index}")
-                        return
-                    
-                    print(f"Found {len(test_cases)} test cases in zip file")
-                    
-                    # Process each test case
-                    for index, file_path in test_cases:
-                        try:
-                            with zip_ref.open(file_path) as file:
-                                data = file.read()
-                                self.inject(index, data)
-                        except KeyboardInterrupt:
-                            print("\nTest case injection aborted by user.")
-                            return
-                        except Exception as e:
-                            print(f"Error processing {file_path}: {str(e)}")
-                    
-                    return  # Successfully processed zip file, don't check directory
-                    
+                self._zip_ref = zipfile.ZipFile(zip_path, 'r')
             except zipfile.BadZipFile:
                 print(f"Warning: {zip_path} exists but is not a valid zip file")
-                # Fall back to directory-based loading
             except Exception as e:
                 print(f"Error reading zip file: {str(e)}")
-                # Fall back to directory-based loading
-            
-        # If no zip file or zip file failed, try directory
-        test_cases = []
-        test_case_path = Path(self.test_case_dir)
+            else:
+                test_cases = self._discover_zip_cases(self._zip_ref)
+                if test_cases:
+                    print(f"Found {len(test_cases)} test cases in zip file")
+                    return 'zip', test_cases
+                print(f"No valid test cases found in zip file in range {self.start_index}-{self.stop_index}")
+                # An explicit -zip is the only source; only an auto-detected
+                # zip falls back to the test case directory
+                if self.zip_file:
+                    return None, []
         
-        if not test_case_path.exists():
-            print(f"Warning: Test case directory '{self.test_case_dir}' not found")
-            print("Server will start but no test cases will be available unless provided by '-file'")
-            return
+        # If no zip file or zip file failed, try directory
+        dir_exists = os.path.isdir(self.test_case_dir)
+        if dir_exists:
+            test_cases = self._discover_cases()
+            if test_cases:
+                return 'dir', test_cases
         
-        # Continue with directory-based test case loading
-        for file in sorted(test_case_path.iterdir()):
+        print(f"No test cases found in range {self.start_index}-{self.stop_index}")
+        if not zip_exists and not dir_exists:
+            print(f"Neither {zip_path} nor directory {self.test_case_dir} found")
+        return None, []
+
+    def _inject_from_zip(self, test_cases):
+        """Inject test cases from the open zip file, in order"""
+        zip_ref = self._zip_ref
+        for index, file_path, future in self._prefetch_zip_entries(zip_ref, test_cases):
             try:
-                index = int(file.name)
-                if self.start_index <= index <= self.stop_index:
-                    test_cases.append((index, file))
-            except ValueError:
-                # Skip files that don't have numeric names
-                pass
-                
-        try:
-            for index, file_path in test_cases:
-                try:
-                    with open(file_path, 'rb') as file:
-                        data = file.read()
-                        self.inject(index, data)
-                except KeyboardInterrupt:
-                    print("\nTest case injection aborted by user.")
-                    return
-                except Exception as e:
-                    print(f"Error: {str(e)}")
-        except KeyboardInterrupt:
-            print("\nTest case injection aborted by user.")
-            return
+                if future is not None:
+                    self.inject(index, future.result())
+                else:
+                    with zip_ref.open(file_path) as file:
+                        self.inject(index, file, zip_ref.getinfo(file_path).file_size)
+            except Exception as e:
+                print(f"Error processing {file_path}: {str(e)}")
+
+    def _inject_from_dir(self, test_cases):
+        """Inject test cases from the test case directory, in order"""
+        for index, file_path in test_cases:
+            try:
+                with open(file_path, 'rb') as file:
+                    self.inject(index, file)
+            except Exception as e:
+                print(f"Error: {str(e)}")
+
+    def parse_test_cases(self, source, test_cases):
+        """Inject test cases found by _enumerate_cases()"""
+        if source == 'zip':
+            self._inject_from_zip(test_cases)
+        else:
+            self._inject_from_dir(test_cases)
 
     def finish(self):
-        """Clean up server socket"""
+        """Clean up server socket, signal wakeup socket and any open zip file"""
+        if self._zip_ref:
+            self._zip_ref.close()
+        if self._selector:
+            signal.set_wakeup_fd(-1)
+            self._selector.close()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
         if self.server_socket:
             self.server_socket.close()
 
     def serve_forever(self):
-        """Keep server running to handle incoming connections"""
+        """Keep server running to handle incoming connections
+
+        Waits in _wait_for_client(), so the idle server uses no CPU; Ctrl+C
+        wakes it through the signal wakeup socket and the SIGINT handler
+        shuts it down.
+        """
         print("Server waiting for connections. Press Ctrl+C to exit.")
         request_count = 0
         
-        # Set a short timeout to make Ctrl+C more responsive
-        self.server_socket.settimeout(0.5)
-        
-        try:
-            while True:
-                try:
-                    client_socket, addr = self.server_socket.accept()
-                    request_count += 1
-                    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    print(f"\n[{now}] Connection #{request_count} from [{addr[0]}:{addr[1]}]")
-                    
-                    # Read and log the request
-                    try:
-                        request = client_socket.recv(1024)
-                        if request:
-                            request_text = request.decode('utf-8', errors='replace').strip()
-                            first_line = request_text.split('\n')[0] if '\n' in request_text else request_text
-                            print(f"Received request: {first_line}")
-                    except Exception as io:
-                        print(f"Error reading request: {str(io)}")
-                        continue
-                    
-                    # Send a basic HTTP response if no test case is specified
-                    response = b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 13\r\n\r\nHello, World!"
-                    try:
-                        client_socket.sendall(response)
-                        print(f"Sent response: HTTP/1.1 200 OK (13 bytes)")
-                    except Exception as io:
-                        print(f"Error sending response: {str(io)}")
-                    
-                    try:
-                        client_socket.close()
-                    except Exception as s:
-                        print(f"Error closing socket: {str(s)}")
+        while True:
+            try:
+                client_socket, addr = self._wait_for_client()
+                request_count += 1
                 
-                except socket.timeout:
-                    # This is expected, continue the loop to allow for keyboard interrupt
+                # Read and log the request
+                try:
+                    size = receive_request(client_socket, self._req_buf)
+                except Exception as io:
+                    self._log(f"Error reading request: {str(io)}")
+                    self._close_client(client_socket)
                     continue
-                except KeyboardInterrupt:
-                    print("\nServer shutting down...")
-                    sys.exit(0)  # Exit immediately
-                except Exception as e:
-                    print(f"Error: {str(e)}")
-        except KeyboardInterrupt:
-            print("\nServer shutting down...")
-            sys.exit(0)  # Exit immediately
+                
+                if __debug__:
+                    first_line = request_line(self._req_buf, size)
+                    now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+                    self._log(f"[{now}] Connection #{request_count} from [{addr[0]}:{addr[1]}] \"{first_line}\"")
+                
+                # Send a basic HTTP response if no test case is specified
+                try:
+                    client_socket.sendall(DEFAULT_RESPONSE)
+                except Exception as io:
+                    self._log(f"Error sending response: {str(io)}")
+                
+                self._close_client(client_socket)
+            
+            except Exception as e:
+                self._log(f"Error: {str(e)}")
 
     def run(self):
         try:
             self.prepare()
-            now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
             print(f"[{now}] Server listening for connections on port {self.port}...")
             
             # Parse and inject test cases if available
             has_test_cases = False
             
-            try:
-                if self.single_file:
-                    has_test_cases = True
-                    self.parse_single_file()
-                else:
-                    # Check for explicit zip file or auto-detected zip file
-                    zip_path = self.zip_file or f"{self.test_case_dir}.zip"
-                    zip_exists = Path(zip_path).exists()
-                    
-                    if zip_exists:
-                        try:
-                            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                                for file_name in zip_ref.namelist():
-                                    base_name = os.path.basename(file_name)
-                                    if base_name:  # Skip directories
-                                        try:
-                                            index = int(base_name)
-                                            if self.start_index <= index <= self.stop_index:
-                                                has_test_cases = True
-                                                break
-                                        except ValueError:
-                                            pass
-                        except Exception:
-                            pass  # If zip file check fails, we'll fall back to directory check
-                    
-                    # If no test cases found in zip, check directory
-                    if not has_test_cases and Path(self.test_case_dir).exists():
-                        test_case_path = Path(self.test_case_dir)
-                        for file in sorted(test_case_path.iterdir()):
-                            try:
-                                index = int(file.name)
-                                if self.start_index <= index <= self.stop_index:
-                                    has_test_cases = True
-                                    break
-                            except ValueError:
-                                pass
-                    
-                    # Parse test cases if found
-                    if has_test_cases:
-                        self.parse_test_cases()
-                    else:
-                        print(f"No test cases found in range {self.start_index}-{self.stop_index}")
-                        if not zip_exists and not Path(self.test_case_dir).exists():
-                            print(f"Neither {zip_path} nor directory {self.test_case_dir} found")
+            if self.single_file:
+                has_test_cases = True
+                self.parse_single_file()
+            else:
+                source, test_cases = self._enumerate_cases()
+                has_test_cases = bool(test_cases)
                 
-            except KeyboardInterrupt:
-                print("\nServer operation interrupted by user.")
-                return
+                # Parse test cases if found
+                if has_test_cases:
+                    self.parse_test_cases(source, test_cases)
             
             # Keep server running if no test cases were injected or if finished injecting
             if not has_test_cases or not self.single_file:
                 self.serve_forever()
                 
-        except KeyboardInterrupt:
-            print("\nServer shutting down...")
         finally:
             self.finish()
 
+# Command-line options with their value types and defaults; bool options
+# are flags that take no value
+OPTIONS = {
+    '-port': (int, 8000),
+    '-closedelay': (int, 0),
+    '-single': (int, None),
+    '-start': (int, 0),
+    '-stop': (int, sys.maxsize),
+    '-file': (str, None),
+    '-testdir': (str, 'testcases'),
+    '-zip': (str, None),
+    '-reuseport': (bool, False),
+}
+
+def usage_error(message):
+    """Report a command-line error and exit with status 2, like argparse"""
+    prog = os.path.basename(sys.argv[0])
+    sys.stderr.write(f"{prog}: error: {message}\n")
+    sys.exit(2)
+
+def parse_args(argv):
+    """Parse command-line options into a dict keyed by option name
+
+    Options are given as '-port 8000' or '-port=8000' and may be shortened
+    to any unambiguous prefix, e.g. '-p 8000'. Keys drop the leading dash.
+    """
+    args = {option[1:]: default for option, (_, default) in OPTIONS.items()}
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        i += 1
+        if arg in ('-h', '--help'):
+            print_usage()
+            sys.exit(0)
+        
+        name, has_value, value = arg.partition('=')
+        if name in OPTIONS:
+            matches = [name]
+        elif len(name) > 1 and name.startswith('-'):
+            matches = [option for option in OPTIONS if option.startswith(name)]
+        else:
+            matches = []
+        if not matches:
+            usage_error(f"unrecognized arguments: {arg}")
+        if len(matches) > 1:
+            usage_error(f"ambiguous option: {name} could match {', '.join(matches)}")
+        option = matches[0]
+        convert = OPTIONS[option][0]
+        
+        if convert is bool:
+            if has_value:
+                usage_error(f"argument {option}: ignored explicit argument '{value}'")
+            args[option[1:]] = True
+            continue
+        if not has_value:
+            if i >= len(argv):
+                usage_error(f"argument {option}: expected one argument")
+            value = argv[i]
+            i += 1
+        try:
+            args[option[1:]] = convert(value)
+        except ValueError:
+            usage_error(f"argument {option}: invalid {convert.__name__} value: '{value}'")
+    return args
+
 def main():
-    # Print usage information at startup
-    print_usage()
-    
-    parser = argparse.ArgumentParser(description='HTTP Reply Test Server')
-    parser.add_argument('-port', type=int, default=8000, 
-                      help='Port number to listen on (default: 8000)')
-    parser.add_argument('-closedelay', type=int, default=0,
-                      help='Delay in milliseconds before closing socket (default: 0)')
-    parser.add_argument('-single', type=int,
-                      help='Inject single test case with specified index')
-    parser.add_argument('-start', type=int, default=0,
-                      help='Start test case index (default: 0)')
-    parser.add_argument('-stop', type=int, default=sys.maxsize,
-                      help='Stop test case index (default: max int)')
-    parser.add_argument('-file', type=str,
-                      help='Send single file instead of test cases')
-    parser.add_argument('-testdir', type=str, default='testcases',
-                      help='Directory containing test cases (default: testcases)')
-    parser.add_argument('-zip', type=str,
-                      help='Path to zip file containing test cases')
-
-    args = parser.parse_args()
+    args = parse_args(sys.argv[1:])
     
     server = HTTPReplyTestServer()
-    server.port = args.port
-    server.close_delay = args.closedelay
+    server.port = args['port']
+    server.close_delay = args['closedelay']
     
     # Handle single index option
-    if args.single is not None:
-        server.start_index = args.single
-        server.stop_index = args.single
+    if args['single'] is not None:
+        server.start_index = args['single']
+        server.stop_index = args['single']
     else:
-        server.start_index = args.start
-        server.stop_index = args.stop
+        server.start_index = args['start']
+        server.stop_index = args['stop']
         
-    server.test_case_dir = args.testdir
-    server.single_file = args.file
-    server.zip_file = args.zip
+    server.test_case_dir = args['testdir']
+    server.single_file = args['file']
+    server.zip_file = args['zip']
+    server.reuse_port = args['reuseport']
     
     server.run()
 
 if __name__ == "__main__":
-    try:
-        main()
-    except KeyboardInterrupt:
-        print("\nServer shutting down...")
-        sys.exit(0)
\ No newline at end of file
+    main()
\ No newline at end of file